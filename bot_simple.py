@@ -2,11 +2,11 @@
 import os
 import re
 import time
-import json
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, List
 
+import orjson
 import requests
 from dotenv import load_dotenv
 
@@ -17,6 +17,7 @@ from daily_act import (
 )
 from catalog_lookup import ProductNotFoundError, MultipleProductsNotFoundError
 from voice_handler import transcribe_audio, enhance_transcription_with_gpt
+from utils import NUMBER_RE, QTY_RE
 
 load_dotenv()
 TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
@@ -87,7 +88,7 @@ def send_message(chat_id: int, text: str, reply_markup=None):
         "text": text,
     }
     if reply_markup:
-        data["reply_markup"] = json.dumps(reply_markup)
+        data["reply_markup"] = orjson.dumps(reply_markup).decode()
     api_post("sendMessage", data)
 
 
@@ -150,11 +151,6 @@ def send_product_choice(chat_id: int, original: str, suggestions: List[tuple], i
     # Создаем inline кнопки
     buttons = []
     for idx, (name, score) in enumerate(suggestions[:5], 1):  # Топ-5
-        callback_data = json.dumps({
-            "action": "replace_product",
-            "item_index": item_index,
-            "new_name": name
-        })
         # Telegram callback_data ограничен 64 байтами, используем короткий формат
         callback_short = f"prod:{item_index}:{idx-1}"
         
@@ -226,6 +222,15 @@ def format_items(items: List[Dict], doc_type: str = "production") -> str:
     return "\n".join(lines)
 
 
+# Разделители между позициями:
+# - переносы строк
+# - точка с запятой
+# - запятая с пробелом после (но не "2,5" внутри числа)
+# - точка на границе предложения
+_ITEM_SEPARATOR_RE = re.compile(r"(?:\n|;|,\s+|\.(?=\s|$))")
+_TRAILING_PUNCT_RE = re.compile(r"[\.,;:]+$")
+
+
 def _smart_parse_quantity(parts: list) -> tuple:
     """
     Умный парсинг количества из списка слов.
@@ -303,29 +308,15 @@ def parse_items_from_text(text: str):
     - Умный парсинг чисел: "2 0.97" → 2.97, "0,44" → 0.44.
     """
 
-    # Разделители между позициями:
-    # - переносы строк
-    # - точка с запятой
-    # - запятая с пробелом после (но не "2,5" внутри числа)
-    # - точка на границе предложения
-    separator_regex = r"(?:\n|;|,\s+|\.(?=\s|$))"
-    raw_chunks = re.split(separator_regex, text or "")
-    chunks = []
-    for c in raw_chunks:
-        c = c.strip()
-        if not c:
-            continue
-        # Удаляем завершающую пунктуацию
-        c = re.sub(r"[\.,;:]+$", "", c).strip()
-        if c:
-            chunks.append(c)
-
     items = []
     errors = []
 
-    for chunk in chunks:
-        chunk_norm = re.sub(r"\s+", " ", chunk).strip()
-        parts = chunk_norm.split()
+    for chunk in _ITEM_SEPARATOR_RE.split(text or ""):
+        # Удаляем завершающую пунктуацию; split() заодно схлопывает пробелы
+        chunk = _TRAILING_PUNCT_RE.sub("", chunk.strip()).strip()
+        if not chunk:
+            continue
+        parts = chunk.split()
         name, qty = _smart_parse_quantity(parts)
         if name is None or qty is None:
             errors.append(chunk)
@@ -400,12 +391,13 @@ def validate_and_normalize_items(items: List[Dict], doc_type: str) -> tuple:
     
     warnings: список предупреждений о проблемах
     """
-    from daily_act import _pick_best_known_names, _parse_item_quantity
+    from daily_act import _pick_best_known_names, _parse_item_quantity, _prime_known_names
     from catalog_lookup import get_purchase_item
     from compositions import build_components_for_output
     
     validated = []
     warnings = []
+    _prime_known_names(items)
     
     for idx, item in enumerate(items):
         name_input = str(item.get("name", "")).strip()
@@ -497,11 +489,10 @@ def split_valid_invalid_items(items: List[Dict]):
             if not raw_str:
                 bad.append({"name": name, "qty_raw": raw_str, "reason": "empty"})
                 continue
-            try:
-                qty = float(raw_str.replace(",", "."))
-            except ValueError:
+            if not QTY_RE.fullmatch(raw_str):
                 bad.append({"name": name, "qty_raw": raw_str, "reason": "invalid"})
                 continue
+            qty = float(raw_str.replace(",", "."))
 
         if qty == 0:
             bad.append({"name": name, "qty_raw": raw_str, "reason": "zero"})
@@ -804,7 +795,7 @@ def handle_text(chat_id: int, text: str):
         return
 
     # Быстрая проверка: если текст содержит несколько чисел - это добавление позиций
-    numbers_count = len(re.findall(r'\d+[.,]?\d*', text))
+    numbers_count = len(NUMBER_RE.findall(text))
     
     # Пробуем распознать как команду редактирования только если:
     # 1) Уже есть позиции в списке
@@ -817,7 +808,7 @@ def handle_text(chat_id: int, text: str):
             
             # Специальный случай: добавление новых позиций
             if result_msg.startswith("add:"):
-                items_to_add = json.loads(result_msg[4:])
+                items_to_add = orjson.loads(result_msg[4:])
                 # Валидируем новые позиции
                 send_message(chat_id, "Проверяю новые позиции...")
                 try:
@@ -1,11 +1,16 @@
 # catalog_lookup.py
+import atexit
+import logging
+import queue
+import threading
+from functools import lru_cache
+from logging.handlers import QueueHandler, QueueListener
+from pathlib import Path
 from typing import Dict, List, Tuple
 
-import pandas as pd
-
 from config import PATHS
-from utils import to_float_safe
-from name_matching import find_best_match
+from utils import to_float_safe, read_excel_cached
+from name_matching import find_best_match_cached, top_matches
 
 
 class ProductNotFoundError(Exception):
@@ -37,13 +42,16 @@ class MultipleProductsNotFoundError(Exception):
         super().__init__(msg)
 
 # Грузим один раз
-DF_RAW = pd.read_excel(PATHS.catalog_excel, sheet_name="Таблица")
+DF_RAW = read_excel_cached(PATHS.catalog_excel, PATHS.cache_dir, sheet_name="Таблица")
 
 # Чистим строки без единиц измерения (типа "ИП ПЛЕТНЁВ", "Фишер" и т.п.)
 DF_CAT = DF_RAW.copy()
 DF_CAT["Ед"] = DF_CAT["Единицы измерения"].astype(str).str.strip()
 DF_CAT = DF_CAT[DF_CAT["Ед"] != ""]
 
+# Уникальные имена для подбора (tuple — чтобы find_best_match кешировал нормализацию)
+CATALOG_NAMES = tuple(dict.fromkeys(DF_CAT["Наименование"].astype(str)))
+
 # ОКЕИ по единицам (как в compositions.py)
 OKEI_BY_UNIT = {
     "кг": "166",
@@ -80,7 +88,7 @@ def resolve_purchase_name(name: str, min_score: float = 0.55) -> str:
         if (any(word in name_lower for word in ["колбас", "охот", "кол"]) or 
             name_lower.strip() in ["хот", "хот."]):
             # Явно ищем КОЛБАСКИ ОХОТНИЧЬИ
-            for cat_name in DF_CAT["Наименование"].astype(str).tolist():
+            for cat_name in CATALOG_NAMES:
                 if "КОЛБАСКИ ОХОТНИЧЬИ" in cat_name.upper():
                     import sys
                     print(f"[INFO] Специальная обработка: '{name_clean}' → 'КОЛБАСКИ ОХОТНИЧЬИ'", 
@@ -88,8 +96,7 @@ def resolve_purchase_name(name: str, min_score: float = 0.55) -> str:
                     _log_catalog_match(name_clean, cat_name, 1.0)
                     return cat_name
 
-    catalog_names = DF_CAT["Наименование"].astype(str).tolist()
-    candidate, score = find_best_match(name_clean, catalog_names)
+    candidate, score = find_best_match_cached(name_clean, CATALOG_NAMES)
     
     # Логируем результат поиска
     _log_catalog_match(name_clean, candidate, score)
@@ -103,27 +110,43 @@ def resolve_purchase_name(name: str, min_score: float = 0.55) -> str:
         return candidate
 
     # Если не найдено, показываем топ-5 похожих для выбора
-    from name_matching import calc_similarity
-    scores = [(n, calc_similarity(name_clean, n)) for n in catalog_names if n.strip()]
-    scores.sort(key=lambda x: x[1], reverse=True)
-    top_matches = scores[:5]  # Топ-5 для выбора
-    
-    raise ProductNotFoundError(name_clean, top_matches)
+    top = top_matches(name_clean, CATALOG_NAMES, limit=5)  # Топ-5 для выбора
+
+    raise ProductNotFoundError(name_clean, top)
+
+
+# Лог подбора пишет фоновый поток: вызывающий код только кладёт запись в очередь,
+# файл открыт один раз (раньше — open/close на каждый поиск)
+_CATALOG_LOGGER = None
+_CATALOG_LOGGER_LOCK = threading.Lock()
+
+
+def _get_catalog_logger() -> logging.Logger:
+    global _CATALOG_LOGGER
+    with _CATALOG_LOGGER_LOCK:
+        if _CATALOG_LOGGER is None:
+            log_path = Path(PATHS.catalog_log)
+            log_path.parent.mkdir(parents=True, exist_ok=True)
+
+            file_handler = logging.FileHandler(log_path, encoding="utf-8")
+            file_handler.setFormatter(logging.Formatter("%(asctime)s | %(message)s", "%Y-%m-%d %H:%M:%S"))
+
+            log_queue = queue.SimpleQueue()
+            listener = QueueListener(log_queue, file_handler)
+            listener.start()
+            atexit.register(listener.stop)  # дописываем очередь при выходе
+
+            logger = logging.getLogger("catalog_matching")
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+            logger.addHandler(QueueHandler(log_queue))
+            _CATALOG_LOGGER = logger
+    return _CATALOG_LOGGER
 
 
 def _log_catalog_match(query: str, result: str, score: float):
     """Логирует результаты поиска в каталоге."""
-    from datetime import datetime
-    from pathlib import Path
-    
-    log_dir = Path("logs")
-    log_dir.mkdir(exist_ok=True)
-    log_file = log_dir / "catalog_matching.log"
-    
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    
-    with open(log_file, "a", encoding="utf-8") as f:
-        f.write(f"{timestamp} | Query: '{query}' -> Result: '{result}' (score: {score:.3f})\n")
+    _get_catalog_logger().info("Query: '%s' -> Result: '%s' (score: %.3f)", query, result, score)
 
 
 def get_purchase_item(name: str) -> Dict:
@@ -137,6 +160,16 @@ def get_purchase_item(name: str) -> Dict:
       "price": <закупочная цена (float)>
     }
     """
+    # Одно и то же название за документ спрашивают несколько раз
+    # (валидация + сборка строк, повторяющиеся позиции) — считаем один раз
+    return dict(_get_purchase_item_cached(name))
+
+
+# Кеш держит название, код и цену из DF_CAT, прочитанного при импорте модуля.
+# Если Каталог когда-нибудь будут перечитывать на лету — вызвать
+# _get_purchase_item_cached.cache_clear() вместе с name_matching.clear_match_caches().
+@lru_cache(maxsize=4096)
+def _get_purchase_item_cached(name: str) -> Dict:
     canonical = resolve_purchase_name(name)
     sub = DF_CAT[DF_CAT["Наименование"] == canonical]
     if sub.empty:
@@ -2,15 +2,17 @@
 from pathlib import Path
 from typing import Dict, List
 
-import pandas as pd
-
 from config import PATHS
-from utils import to_float_safe
-from name_matching import find_best_match
+from utils import to_float_safe, read_excel_cached
+from name_matching import find_best_match_cached
 
 # Грузим один раз
-DF_COMP = pd.read_excel(PATHS.compositions_excel)
-DF_PROD = pd.read_excel(PATHS.production_excel, sheet_name="Таблица")
+DF_COMP = read_excel_cached(PATHS.compositions_excel, PATHS.cache_dir)
+DF_PROD = read_excel_cached(PATHS.production_excel, PATHS.cache_dir, sheet_name="Таблица")
+
+# Уникальные имена для подбора (tuple — чтобы find_best_match кешировал нормализацию)
+PARENT_NAMES = tuple(dict.fromkeys(DF_COMP["Родитель"].astype(str)))
+PRODUCTION_NAMES = tuple(dict.fromkeys(DF_PROD["Наименование"].astype(str)))
 
 # ОКЕИ по единицам измерения
 OKEI_BY_UNIT = {
@@ -29,7 +31,7 @@ def resolve_parent_name(name: str) -> str:
     """
     name_clean = name.strip()
 
-    candidate, score = find_best_match(name_clean, DF_COMP["Родитель"].astype(str).tolist())
+    candidate, score = find_best_match_cached(name_clean, PARENT_NAMES)
     if candidate and score >= 0.55:
         return candidate
 
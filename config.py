@@ -31,6 +31,7 @@ class PathsConfig:
     production_excel: str = "Производство.xlsx"
     tmp_images_dir: str = "tmp_images"
     logs_dir: str = "logs"
+    cache_dir: str = ".cache"
     ocr_log: str = "logs/ocr_tables.log"
     catalog_log: str = "logs/catalog_matching.log"
 
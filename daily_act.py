@@ -1,22 +1,52 @@
 # daily_act.py
 import base64
 import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-from typing import List, Dict
+from functools import lru_cache, partial
+from types import MappingProxyType
+from typing import List, Dict, Optional
 
-import xml.etree.ElementTree as ET
-import requests
+from lxml import etree as ET
+import orjson
 
 from config import COMPANY, TIMEOUTS
-from utils import to_float_safe, format_quantity
-from sbis_auth import get_auth_headers
-from compositions import DF_COMP, DF_PROD, build_components_for_output
-from catalog_lookup import DF_CAT, get_purchase_item, ProductNotFoundError, MultipleProductsNotFoundError
-from name_matching import find_best_match
+from utils import QTY_RE, format_quantity
+from sbis_auth import SESSION, get_auth_headers
+from compositions import PARENT_NAMES, PRODUCTION_NAMES, build_components_for_output
+from catalog_lookup import CATALOG_NAMES, get_purchase_item, ProductNotFoundError, MultipleProductsNotFoundError
+from name_matching import calc_similarity, find_best_match_cached, prime_best_matches
 
 
 SBIS_URL = "https://online.sbis.ru/service/?srv=1"
 
+# Неизменные атрибуты строк СтрТабл / СоставСтрТабл. Пустые значения — места под
+# атрибуты конкретной строки: {**_ROW_CONST, ...} сохраняет порядок атрибутов в XML.
+_ROW_CONST = MappingProxyType({
+    "Вместимость": "0",
+    "ЕдИзм": "",
+    "ЗаказатьКодов": "0",
+    "Идентификатор": "",
+    "Кол_во": "",
+    "Название": "",
+    "ОКЕИ": "",
+    "ПорНомер": "",
+    "Сумма": "0.00",
+    "Цена": "0.00",
+})
+_COMP_CONST = MappingProxyType({
+    "Вместимость": "0",
+    "ЕдИзм": "",
+    "Идентификатор": "",
+    "Кол_во": "",
+    "Кол_во_План": "",
+    "Название": "",
+    "ОКЕИ": "",
+    "ПорНомер": "",
+    "Сумма": "0.00",
+    "Цена": "0.00",
+})
+
 # Константы твоей организации (из config)
 SENDER_TITLE = "Плетнёв Виталий Николаевич, ИП, точка продаж"
 ORG_FL = {
@@ -29,6 +59,16 @@ ORG_FL = {
 }
 NASH_ORG = {"СвФЛ": ORG_FL}
 
+# Реквизиты склада/списания, которые пишем в каждый акт — читаем из COMPANY один раз.
+# COMPANY — значения по умолчанию из config, во время работы их никто не меняет
+# (как и ИНН в ORG_FL выше), поэтому копии при импорте не устаревают.
+_WH_ID = COMPANY.warehouse_id
+_WH_NAME = COMPANY.warehouse_name
+_WRITEOFF_PURPOSE = COMPANY.writeoff_purpose
+_RECIPIENT = COMPANY.recipient_name
+_ACCOUNT = COMPANY.account
+
+
 # Настройки типов документов.
 # production / writeoff – внутренние native (3.01)
 # income – входящий отгрузочный + УПД (УпдДоп, КНД 1115131, ВерсияФормата 5.03)
@@ -73,7 +113,21 @@ DOC_KINDS = {
 
 def _pick_best_known_names(user_input: str) -> Dict:
     """Ищем самое подходящее название во всех справочниках."""
+    # Одно название проверяется при валидации и ещё раз при сборке строк,
+    # плюс повторяющиеся позиции — подбор по трём справочникам делаем один раз.
+    # Отдаём копию, чтобы вызывающий код не испортил закешированный результат.
+    cached = _pick_best_known_names_cached(user_input)
+    return {
+        "overall": dict(cached["overall"]),
+        "by_source": {source: dict(match) for source, match in cached["by_source"].items()},
+    }
+
 
+# Кеш построен на списках PARENT_NAMES / PRODUCTION_NAMES / CATALOG_NAMES,
+# собранных при импорте. При перечитывании справочников на лету — вызвать
+# _pick_best_known_names_cached.cache_clear() вместе с name_matching.clear_match_caches().
+@lru_cache(maxsize=4096)
+def _pick_best_known_names_cached(user_input: str) -> Dict:
     # СПЕЦИАЛЬНАЯ ОБРАБОТКА: "хот" vs "охотничьи"
     # Если в запросе "хот" без "соус" - это КОЛБАСКИ ОХОТНИЧЬИ, а не СОУС ХОТ
     user_lower = user_input.lower().strip()
@@ -92,16 +146,16 @@ def _pick_best_known_names(user_input: str) -> Dict:
             return result
 
     sources = {
-        "composition": DF_COMP["Родитель"].astype(str).tolist(),
-        "production": DF_PROD["Наименование"].astype(str).tolist(),
-        "catalog": DF_CAT["Наименование"].astype(str).tolist(),
+        "composition": PARENT_NAMES,
+        "production": PRODUCTION_NAMES,
+        "catalog": CATALOG_NAMES,
     }
 
     best_overall = {"score": 0.0, "name": None, "source": None}
     per_source: Dict[str, Dict] = {}
 
     for source, names in sources.items():
-        candidate, score = find_best_match(user_input, names)
+        candidate, score = find_best_match_cached(user_input, names)
         if candidate:
             per_source[source] = {"name": candidate, "score": score}
             if score > best_overall["score"]:
@@ -112,7 +166,7 @@ def _pick_best_known_names(user_input: str) -> Dict:
         from catalog_lookup import resolve_purchase_name
         catalog_resolved = resolve_purchase_name(user_input, min_score=0.5)
         # Пересчитываем score для точного соответствия
-        catalog_score = find_best_match(user_input, [catalog_resolved])[1]
+        catalog_score = calc_similarity(user_input, catalog_resolved)
         if catalog_score >= 0.5:
             per_source["catalog"] = {"name": catalog_resolved, "score": catalog_score}
             if catalog_score > best_overall["score"]:
@@ -123,6 +177,19 @@ def _pick_best_known_names(user_input: str) -> Dict:
     return {"overall": best_overall, "by_source": per_source}
 
 
+def _prime_known_names(daily_items: List[Dict]) -> None:
+    """
+    Подбор по справочникам для всех позиций документа одним пакетом на справочник —
+    дальше _pick_best_known_names по каждой позиции берёт готовые результаты.
+    """
+    names = [str(item.get("name", "")).strip() for item in daily_items]
+    names = [name for name in names if name]
+    if not names:
+        return
+    for source_names in (PARENT_NAMES, PRODUCTION_NAMES, CATALOG_NAMES):
+        prime_best_matches(names, source_names)
+
+
 def _create_xml_root(doc_kind: str, doc_date: str, doc_number: str) -> tuple:
     """Создает корневой элемент XML и документ."""
     kind = DOC_KINDS.get(doc_kind)
@@ -153,10 +220,10 @@ def _parse_item_quantity(raw_qty) -> float:
         return float(raw_qty)
     
     raw_str = str(raw_qty).strip()
-    if not raw_str:
+    if not QTY_RE.fullmatch(raw_str):
         return 0.0
     
-    return to_float_safe(raw_str, default=0.0)
+    return float(raw_str.replace(",", "."))
 
 
 def _build_income_row(item_name: str, qty: float, line_index: int, best_by_source: Dict) -> Dict:
@@ -166,16 +233,13 @@ def _build_income_row(item_name: str, qty: float, line_index: int, best_by_sourc
     meta = get_purchase_item(target_name)
     
     return {
-        "Вместимость": "0",
+        **_ROW_CONST,
         "ЕдИзм": meta["unit"],
-        "ЗаказатьКодов": "0",
         "Идентификатор": meta["code"],
         "Кол_во": format_quantity(qty),
         "Название": meta["name"],
         "ОКЕИ": meta["okeei"],
         "ПорНомер": str(line_index),
-        "Сумма": "0.00",
-        "Цена": "0.00",
     }
 
 
@@ -199,33 +263,29 @@ def _build_production_row_with_recipe(item_name: str, qty: float, line_index: in
     
     # Строка родителя
     row_attrs = {
-        "Вместимость": "0",
+        **_ROW_CONST,
         "ЕдИзм": unit,
-        "ЗаказатьКодов": "0",
         "Идентификатор": parent_code,
         "Кол_во": format_quantity(qty),
         "Название": parent_name,
         "ОКЕИ": okee,
         "ПорНомер": str(line_index),
-        "Сумма": "0.00",
-        "Цена": "0.00",
     }
     row = ET.SubElement(tab_element, "СтрТабл", row_attrs)
     
     # Состав
     comp_index = 1
     for comp in recipe["components"]:
+        comp_qty = f"{comp['qty']:.6f}"
         comp_attrs = {
-            "Вместимость": "0",
+            **_COMP_CONST,
             "ЕдИзм": comp["unit"],
             "Идентификатор": comp["code"],
-            "Кол_во": f"{comp['qty']:.6f}",
-            "Кол_во_План": f"{comp['qty']:.6f}",
+            "Кол_во": comp_qty,
+            "Кол_во_План": comp_qty,
             "Название": comp["name"],
             "ОКЕИ": comp["okeei"],
             "ПорНомер": str(comp_index),
-            "Сумма": "0.00",
-            "Цена": "0.00",
         }
         ET.SubElement(row, "СоставСтрТабл", comp_attrs)
         comp_index += 1
@@ -240,16 +300,13 @@ def _build_catalog_row(item_name: str, qty: float, line_index: int, best_by_sour
     meta = get_purchase_item(target_name)
     
     return {
-        "Вместимость": "0",
+        **_ROW_CONST,
         "ЕдИзм": meta["unit"],
-        "ЗаказатьКодов": "0",
         "Идентификатор": meta["code"],
         "Кол_во": format_quantity(qty),
         "Название": meta["name"],
         "ОКЕИ": meta["okeei"],
         "ПорНомер": str(line_index),
-        "Сумма": "0.00",
-        "Цена": "0.00",
     }
 
 
@@ -260,13 +317,13 @@ def _add_sender_receiver(doc_element):
     })
     ET.SubElement(sender, "СвФЛ", ORG_FL)
     ET.SubElement(sender, "Склад", {
-        "Идентификатор": COMPANY.warehouse_id,
-        "Название": COMPANY.warehouse_name,
+        "Идентификатор": _WH_ID,
+        "Название": _WH_NAME,
     })
     
     receiver = ET.SubElement(doc_element, "Получатель")
     ET.SubElement(receiver, "Склад", {
-        "Название": COMPANY.warehouse_name,
+        "Название": _WH_NAME,
     })
 
 
@@ -274,10 +331,10 @@ def _add_writeoff_reason(doc_element):
     """Добавляет причину списания (ТаблСклад) для актов списания."""
     tabl_sklad = ET.SubElement(doc_element, "ТаблСклад")
     ET.SubElement(tabl_sklad, "СтрТабл", {
-        "Назначение": COMPANY.writeoff_purpose,
-        "Получатель": COMPANY.recipient_name,
-        "Склад": COMPANY.warehouse_name,
-        "Счет": COMPANY.account,
+        "Назначение": _WRITEOFF_PURPOSE,
+        "Получатель": _RECIPIENT,
+        "Склад": _WH_NAME,
+        "Счет": _ACCOUNT,
     })
 
 
@@ -287,6 +344,7 @@ def _validate_all_items_resolvable(daily_items: List[Dict], doc_kind: str) -> No
     Если есть проблемы - выбрасывает MultipleProductsNotFoundError со всеми ошибками.
     """
     errors = []
+    _prime_known_names(daily_items)
     
     for idx, item in enumerate(daily_items):
         name_input = str(item.get("name", "")).strip()
@@ -394,8 +452,12 @@ def build_native_xml(doc_kind: str,
         _add_writeoff_reason(doc)
 
     # Генерация итогового XML
-    xml_bytes = ET.tostring(root, encoding="windows-1251", xml_declaration=True)
-    return xml_bytes
+    return _serialize_tree(root)
+
+
+def _serialize_tree(root) -> bytes:
+    """Сериализует акт в windows-1251 вместе с XML-декларацией (пишет сам libxml2)."""
+    return ET.tostring(root, encoding="windows-1251", xml_declaration=True, standalone=None)
 
 
 def build_payload_for_sbis(doc_kind: str,
@@ -449,15 +511,13 @@ def send_any_act(doc_kind: str,
     payload = build_payload_for_sbis(doc_kind, doc_date, doc_number, xml_bytes)
 
     headers = get_auth_headers()
-    headers.update({
-        "Content-Type": "application/json-rpc;charset=utf-8",
-        "User-Agent": "YenPrestoBot/1.0",
-    })
+    headers["Content-Type"] = "application/json-rpc;charset=utf-8"
 
-    resp = requests.post(
+    resp = SESSION.post(
         SBIS_URL,
         headers=headers,
-        data=json.dumps(payload, ensure_ascii=False).encode("utf-8"),
+        # orjson сразу отдаёт UTF-8 bytes — без промежуточной str
+        data=orjson.dumps(payload),
         timeout=30,
     )
 
@@ -485,9 +545,54 @@ from income_upd import send_income_upd
 
 def send_income_act(doc_date: str,
                     doc_number: str,
-                    daily_items: List[Dict]) -> Dict:
+                    daily_items: List[Dict],
+                    dt: Optional[datetime] = None) -> Dict:
     # Приход теперь делаем через нормальный УПД на базе шаблона
-    return send_income_upd(doc_date, doc_number, daily_items)
+    return send_income_upd(doc_date, doc_number, daily_items, dt)
+
+
+def send_all_daily(doc_date: str,
+                   doc_number: str,
+                   prod_items: List[Dict],
+                   writeoff_items: List[Dict],
+                   income_items: List[Dict]) -> Dict[str, Dict]:
+    """
+    Отправляет документы за день (производство/списание/приход) параллельно.
+
+    Документы независимы, а время уходит на ожидание ответа СБИС, поэтому
+    хватает потоков; соединения берутся из общего SESSION.
+    Пустые списки пропускаются.
+
+    Returns:
+        {doc_kind: ответ СБИС}; если сборка/отправка упала — {"error": текст}
+    """
+    # Дату разбираем один раз на весь набор; кривую дату оставляем УПД — там и упадёт
+    try:
+        dt = datetime.strptime(doc_date, "%d.%m.%Y")
+    except ValueError:
+        dt = None
+
+    senders = {
+        "production": (send_daily_act, prod_items),
+        "writeoff": (send_writeoff_act, writeoff_items),
+        "income": (partial(send_income_act, dt=dt), income_items),
+    }
+
+    results: Dict[str, Dict] = {}
+    with ThreadPoolExecutor(max_workers=len(senders)) as pool:
+        futures = {
+            pool.submit(sender, doc_date, doc_number, items): kind
+            for kind, (sender, items) in senders.items()
+            if items
+        }
+        for future in as_completed(futures):
+            kind = futures[future]
+            try:
+                results[kind] = future.result()
+            except Exception as e:
+                results[kind] = {"error": str(e)}
+
+    return results
 
 # Для ручного теста
 if __name__ == "__main__":
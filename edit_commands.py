@@ -3,49 +3,25 @@
 Модуль для обработки команд редактирования списка через GPT.
 """
 
-import json
+import re
 from typing import Dict, List, Optional
-from openai import OpenAI
-import os
-from dotenv import load_dotenv
+import orjson
 
-load_dotenv()
+from openai_client import chat_completion
 
-_OPENAI_CLIENT = None
+# Слова, по которым текст похож на команду редактирования
+_EDIT_TRIGGER_RE = re.compile(
+    r"\b(удал|убер|измен|переимен|помен|замен|исправ|было|теперь|последн)"
+    r"|\bне\s+\S+\s+а\s+",
+    re.IGNORECASE,
+)
+# Пара "Название Количество" — признак обычного списка позиций
+_ADD_PATTERN_RE = re.compile(r"[A-Za-zА-Яа-яЁё]+\s+\d+[.,]?\d*")
+# Ответ — короткий JSON с одним действием; длинные списки уходят по быстрому пути
+_EDIT_MAX_TOKENS = 300
 
-
-def _get_openai_client() -> OpenAI:
-    """Ленивая инициализация OpenAI клиента."""
-    global _OPENAI_CLIENT
-    if _OPENAI_CLIENT is None:
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            raise RuntimeError("OPENAI_API_KEY не установлен в .env")
-        _OPENAI_CLIENT = OpenAI(api_key=api_key)
-    return _OPENAI_CLIENT
-
-
-def parse_edit_command(text: str, current_items: List[Dict]) -> Optional[Dict]:
-    """
-    Определяет тип команды редактирования и извлекает параметры через GPT.
-    
-    Args:
-        text: Текст команды ("удали последнюю позицию", "лука не 7 а 0.7")
-        current_items: Текущий список позиций [{"name": str, "qty": float}, ...]
-        
-    Returns:
-        {
-            "action": "delete_last" | "delete_by_name" | "change_qty" | "rename" | "add" | "unknown",
-            "params": {...}  # зависит от действия
-        }
-        или None если это не команда редактирования
-    """
-    client = _get_openai_client()
-    
-    # Формируем список для контекста
-    items_text = "\n".join([f"{i+1}. {it['name']} — {it['qty']}" for i, it in enumerate(current_items)])
-    
-    prompt = f"""Ты — система распознавания команд редактирования списка товаров.
+# Неизменная часть запроса к GPT; подставляются только список и команда
+_EDIT_PROMPT_TEMPLATE = """Ты — система распознавания команд редактирования списка товаров.
 
 Текущий список:
 {items_text}
@@ -92,17 +68,35 @@ def parse_edit_command(text: str, current_items: List[Dict]) -> Optional[Dict]:
 
 Верни ТОЛЬКО JSON, без пояснений."""
 
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            response_format={"type": "json_object"},
-            temperature=0,
-            max_tokens=500
-        )
+
+def parse_edit_command(text: str, current_items: List[Dict]) -> Optional[Dict]:
+    """
+    Определяет тип команды редактирования и извлекает параметры через GPT.
+    
+    Args:
+        text: Текст команды ("удали последнюю позицию", "лука не 7 а 0.7")
+        current_items: Текущий список позиций [{"name": str, "qty": float}, ...]
         
-        result_text = response.choices[0].message.content.strip()
-        result = json.loads(result_text)
+    Returns:
+        {
+            "action": "delete_last" | "delete_by_name" | "change_qty" | "rename" | "add" | "unknown",
+            "params": {...}  # зависит от действия
+        }
+        или None если это не команда редактирования
+    """
+    # Быстрый путь: нет слов-команд, зато несколько пар "Название Число" —
+    # это просто список позиций, GPT не дёргаем
+    if not _EDIT_TRIGGER_RE.search(text) and len(_ADD_PATTERN_RE.findall(text)) >= 2:
+        return {"action": "unknown", "params": {"reason": "fast-path add"}}
+
+    # Формируем список для контекста
+    items_text = "\n".join([f"{i+1}. {it['name']} — {it['qty']}" for i, it in enumerate(current_items)])
+    
+    prompt = _EDIT_PROMPT_TEMPLATE.format(items_text=items_text, text=text)
+
+    try:
+        result_text = chat_completion(prompt, json_mode=True, max_tokens=_EDIT_MAX_TOKENS)
+        result = orjson.loads(result_text)
         
         return result
         
@@ -197,7 +191,7 @@ def apply_edit_command(command: Dict, items: List[Dict]) -> tuple[List[Dict], st
         new_items_to_add = params.get("items", [])
         if new_items_to_add:
             # items остаются без изменений, новые позиции добавятся отдельно
-            return items, f"add:{json.dumps(new_items_to_add)}"  # Специальный маркер
+            return items, f"add:{orjson.dumps(new_items_to_add).decode()}"  # Специальный маркер
         return items, "❌ Нет позиций для добавления"
     
     else:
@@ -1,13 +1,14 @@
 import base64
+import io
+import re
 import uuid
-from copy import deepcopy
 from datetime import datetime
-from typing import List, Dict
-import xml.etree.ElementTree as ET
-import requests
+from typing import List, Dict, Optional
+import numpy as np
+from lxml import etree as ET
 
-from utils import to_float_safe, format_money, format_quantity
-from sbis_auth import get_auth_headers
+from utils import QTY_RE, to_float_safe, format_money, format_quantity
+from sbis_auth import SESSION, get_auth_headers
 from catalog_lookup import get_purchase_item
 
 SBIS_URL = "https://online.sbis.ru/service/?srv=1"
@@ -15,23 +16,100 @@ SBIS_URL = "https://online.sbis.ru/service/?srv=1"
 # Путь к эталонному входящему УПД (тот XML, что ты загрузил)
 TEMPLATE_UPD_PATH = "ON_NSCHFDOPPR__940200200247_20251116_3EFE5FF7-D5B2-421B-9362-66BF0089799A_0_0_0_0_0_00.xml"
 
+# Шаблон неизменный — читаем с диска один раз, дальше парсим из памяти
+with open(TEMPLATE_UPD_PATH, "rb") as _f:
+    _TEMPLATE_BYTES = _f.read()
+
+# Без подстановки внешних сущностей и сетевых загрузок (защита от XXE)
+_TEMPLATE_PARSER = ET.XMLParser(resolve_entities=False, no_network=True)
+
+# ИНН продавца в ИдФайл: ON_NSCHFDOPPR__<ИНН>_<дата>_...
+_ID_FILE_INN_RE = re.compile(r"^[A-Z_]+__(\d+)_")
+
+
+def _capture_proto(el) -> tuple:
+    """Снимок элемента шаблона: (тег, атрибуты, текст, дети) — без пробельных хвостов."""
+    text = el.text.strip() if el.text and el.text.strip() else None
+    children = [_capture_proto(ch) for ch in el if isinstance(ch.tag, str)]
+    return el.tag, dict(el.attrib), text, children
+
+
+def _append_proto(parent, proto, attrib=None):
+    """Собирает элемент по снимку через SubElement (вместо deepcopy всего поддерева)."""
+    tag, defaults, text, children = proto
+    el = ET.SubElement(parent, tag, {**defaults, **attrib} if attrib else defaults)
+    if text is not None:
+        el.text = text
+    for child in children:
+        _append_proto(el, child)
+    return el
+
+
+def _capture_row_template():
+    """
+    Один раз разбираем строку <СведТов> шаблона: атрибуты по умолчанию
+    и дочерние элементы, из которых потом собираются строки УПД.
+    """
+    root = ET.fromstring(_TEMPLATE_BYTES, _TEMPLATE_PARSER)
+    row = root.find("Документ/ТаблСчФакт/СведТов")
+    if row is None:
+        return {}, []
+    return dict(row.attrib), [_capture_proto(ch) for ch in row if isinstance(ch.tag, str)]
+
+
+_ROW_ATTR_DEFAULTS, _ROW_CHILDREN = _capture_row_template()
+
+
+def _child_index(tag: str, ident: Optional[str] = None) -> Optional[int]:
+    """Позиция дочернего элемента в снимке строки (по тегу и Идентиф), None если нет."""
+    for pos, (child_tag, attrs, _text, _children) in enumerate(_ROW_CHILDREN):
+        if child_tag == tag and (ident is None or attrs.get("Идентиф") == ident):
+            return pos
+    return None
+
+
+# Где в строке лежат поля, которые меняются от позиции к позиции
+_DOP_IDX = _child_index("ДопСведТов")
+_CODE_INF_IDX = _child_index("ИнфПолФХЖ2", "КодПокупателя")
+_NAME_INF_IDX = _child_index("ИнфПолФХЖ2", "НазваниеПокупателя")
+
+# Декларация вида, который даёт ET.tostring(encoding="windows-1251", xml_declaration=True)
+_XML_DECLARATION = b"<?xml version='1.0' encoding='windows-1251'?>\n"
+
+# С какого числа строк числа форматируем одним проходом NumPy
+_VECTORIZE_MIN_ROWS = 64
+
+
+def _format_row_numbers(qtys: List[float], prices: List[float], sums: List[float]):
+    """
+    Строковые КолТов / ЦенаТов / СтТов для всех строк сразу.
+    Для маленьких документов — обычные format_quantity/format_money,
+    для больших — np.char.mod (тот же результат, но без цикла в Python).
+    """
+    if len(qtys) <= _VECTORIZE_MIN_ROWS:
+        return (
+            [format_quantity(q) for q in qtys],
+            [format_money(p) for p in prices],
+            [format_money(s) for s in sums],
+        )
+
+    qty_strs = np.char.rstrip(np.char.rstrip(np.char.mod("%.3f", np.asarray(qtys, dtype=float)), "0"), ".")
+    price_strs = np.char.mod("%.2f", np.asarray(prices, dtype=float))
+    sum_strs = np.char.mod("%.2f", np.asarray(sums, dtype=float))
+    return qty_strs.tolist(), price_strs.tolist(), sum_strs.tolist()
+
 
 def _extract_seller_inn(root) -> str:
     """
     Достаём ИНН продавца из старого ИдФайл, чтобы СБИС распознал поставщика 'Рынок'.
     """
-    old_id = root.attrib.get("ИдФайл", "")
-    try:
-        part = old_id.split("__", 1)[1]
-        inn = part.split("_")[0]
-        return inn
-    except Exception:
-        return "940200200247"  # fallback
-
-
-def build_income_upd_xml(doc_date: str, doc_number: str, daily_items: List[Dict]) -> bytes:
-    tree = ET.parse(TEMPLATE_UPD_PATH)
-    root = tree.getroot()
+    m = _ID_FILE_INN_RE.match(root.attrib.get("ИдФайл", ""))
+    return m.group(1) if m else "940200200247"  # fallback
+
+
+def _build_income_upd_root(doc_date: str, doc_number: str, daily_items: List[Dict],
+                           dt: Optional[datetime] = None):
+    root = ET.fromstring(_TEMPLATE_BYTES, _TEMPLATE_PARSER)
     doc = root.find("Документ")
 
     if doc is None:
@@ -40,7 +118,8 @@ def build_income_upd_xml(doc_date: str, doc_number: str, daily_items: List[Dict]
     # --------------------
     # ИдФайл – правильно
     # --------------------
-    dt = datetime.strptime(doc_date, "%d.%m.%Y")
+    if dt is None:
+        dt = datetime.strptime(doc_date, "%d.%m.%Y")
     date_for_id = dt.strftime("%Y%m%d")
     new_uuid = str(uuid.uuid4())
 
@@ -68,8 +147,7 @@ def build_income_upd_xml(doc_date: str, doc_number: str, daily_items: List[Dict]
     if tbl is None:
         raise RuntimeError("В шаблонном УПД нет <ТаблСчФакт>")
 
-    row_template = tbl.find("СведТов")
-    if row_template is None:
+    if tbl.find("СведТов") is None:
         raise RuntimeError("В шаблонном УПД нет <СведТов>")
 
     for old in list(tbl.findall("СведТов")):
@@ -78,6 +156,7 @@ def build_income_upd_xml(doc_date: str, doc_number: str, daily_items: List[Dict]
     total_sum = 0.0
     total_qty = 0.0
 
+    rows = []
     for idx, item in enumerate(daily_items, start=1):
         name = str(item.get("name", "")).strip()
         if not name:
@@ -93,11 +172,10 @@ def build_income_upd_xml(doc_date: str, doc_number: str, daily_items: List[Dict]
             if not raw_str:
                 # пустое количество вообще не берём в УПД
                 continue
-            try:
-                qty = float(raw_str.replace(",", "."))
-            except ValueError:
+            if not QTY_RE.fullmatch(raw_str):
                 print(f"[WARN] Пропускаю строку '{name}' в УПД, не могу понять количество: {raw_str!r}")
                 continue
+            qty = float(raw_str.replace(",", "."))
 
         if qty == 0:
             # нулевые строки нам в приходе не нужны
@@ -105,10 +183,6 @@ def build_income_upd_xml(doc_date: str, doc_number: str, daily_items: List[Dict]
 
         # Берём данные из каталога
         meta = get_purchase_item(name)
-        code = meta["code"]
-        unit = meta["unit"]
-        okee = meta.get("okeei", "")
-        full_name = meta["name"]
 
         # >>> ТУТ БЫЛА ПРОБЛЕМА <<<
         raw_price = meta.get("price", 0.0)
@@ -119,33 +193,46 @@ def build_income_upd_xml(doc_date: str, doc_number: str, daily_items: List[Dict]
         total_sum += line_sum
         total_qty += qty
 
-        new_row = deepcopy(row_template)
+        rows.append((idx, meta, qty, price, line_sum))
 
-        new_row.set("КолТов", format_quantity(qty))
-        new_row.set("НаимТов", full_name)
-        new_row.set("НаимЕдИзм", unit)
-        if okee:
-            new_row.set("ОКЕИ_Тов", okee)
+    qty_strs, price_strs, sum_strs = _format_row_numbers(
+        [r[2] for r in rows], [r[3] for r in rows], [r[4] for r in rows]
+    )
 
-        new_row.set("НомСтр", str(idx))
-        new_row.set("ЦенаТов", format_money(price))
-        new_row.set("СтТовБезНДС", format_money(line_sum))
-        new_row.set("СтТовУчНал", format_money(line_sum))
+    for (idx, meta, _qty, _price, _sum), qty_str, price_str, sum_str in zip(
+        rows, qty_strs, price_strs, sum_strs
+    ):
+        code = meta["code"]
+        okee = meta.get("okeei", "")
+        full_name = meta["name"]
 
-        dop = new_row.find("ДопСведТов")
-        if dop is None:
-            dop = ET.SubElement(new_row, "ДопСведТов", {"КодТов": code, "ПрТовРаб": "1"})
-        else:
-            dop.set("КодТов", code)
+        row_attrs = {
+            "КолТов": qty_str,
+            "НаимТов": full_name,
+            "НаимЕдИзм": meta["unit"],
+            "НомСтр": str(idx),
+            "ЦенаТов": price_str,
+            "СтТовБезНДС": sum_str,
+            "СтТовУчНал": sum_str,
+        }
+        if okee:
+            row_attrs["ОКЕИ_Тов"] = okee
 
-        for inf in list(new_row.findall("ИнфПолФХЖ2")):
-            ident = inf.attrib.get("Идентиф")
-            if ident == "КодПокупателя":
-                inf.set("Значен", code)
-            elif ident == "НазваниеПокупателя":
-                inf.set("Значен", full_name)
+        new_row = ET.SubElement(tbl, "СведТов", {**_ROW_ATTR_DEFAULTS, **row_attrs})
 
-        tbl.append(new_row)
+        for pos, proto in enumerate(_ROW_CHILDREN):
+            if pos == _DOP_IDX:
+                override = {"КодТов": code}
+            elif pos == _CODE_INF_IDX:
+                override = {"Значен": code}
+            elif pos == _NAME_INF_IDX:
+                override = {"Значен": full_name}
+            else:
+                override = None
+            _append_proto(new_row, proto, override)
+
+        if _DOP_IDX is None:
+            ET.SubElement(new_row, "ДопСведТов", {"КодТов": code, "ПрТовРаб": "1"})
 
     totals = tbl.find("ВсегоОпл")
     if totals is not None:
@@ -153,17 +240,38 @@ def build_income_upd_xml(doc_date: str, doc_number: str, daily_items: List[Dict]
         totals.set("СтТовБезНДСВсего", format_money(total_sum))
         totals.set("СтТовУчНалВсего", format_money(total_sum))
 
-    xml_bytes = ET.tostring(
+    return root
+
+
+def build_income_upd_xml(doc_date: str, doc_number: str, daily_items: List[Dict],
+                         dt: Optional[datetime] = None) -> bytes:
+    root = _build_income_upd_root(doc_date, doc_number, daily_items, dt)
+    return ET.tostring(
         root,
         encoding="windows-1251",
-        xml_declaration=True
+        xml_declaration=True,
+        standalone=None,
     )
-    return xml_bytes
 
 
-def send_income_upd(doc_date: str, doc_number: str, daily_items: List[Dict]):
-    xml_bytes = build_income_upd_xml(doc_date, doc_number, daily_items)
-    xml_b64 = base64.b64encode(xml_bytes).decode("ascii")
+def _income_upd_b64(doc_date: str, doc_number: str, daily_items: List[Dict],
+                    dt: Optional[datetime] = None) -> str:
+    """
+    УПД сразу в base64: пишем XML в BytesIO и кодируем его буфер без
+    промежуточной копии bytes (getbuffer вместо getvalue).
+    """
+    root = _build_income_upd_root(doc_date, doc_number, daily_items, dt)
+    buf = io.BytesIO()
+    # ElementTree.write пишет кодировку в декларации заглавными — ставим её сами, как у tostring
+    buf.write(_XML_DECLARATION)
+    ET.ElementTree(root).write(buf, encoding="windows-1251", xml_declaration=False)
+    with buf.getbuffer() as view:
+        return base64.b64encode(view).decode("ascii")
+
+
+def send_income_upd(doc_date: str, doc_number: str, daily_items: List[Dict],
+                    dt: Optional[datetime] = None):
+    xml_b64 = _income_upd_b64(doc_date, doc_number, daily_items, dt)
 
     payload = {
         "jsonrpc": "2.0",
@@ -199,7 +307,7 @@ def send_income_upd(doc_date: str, doc_number: str, daily_items: List[Dict]):
     }
 
     headers = get_auth_headers()
-    resp = requests.post(SBIS_URL, json=payload, headers=headers, timeout=30)
+    resp = SESSION.post(SBIS_URL, json=payload, headers=headers, timeout=30)
     return resp.json()
 
 
@@ -1,71 +1,85 @@
 """Функции подбора наиболее подходящего названия по строковому сходству."""
 
+import heapq
 import re
-from difflib import SequenceMatcher
-from typing import Iterable, Optional, Tuple
+import threading
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
 
+import numpy as np
+from rapidfuzz import fuzz, process
+from rapidfuzz.distance import Levenshtein
 
+__all__ = [
+    "calc_similarity",
+    "find_best_match",
+    "find_best_match_cached",
+    "find_best_matches",
+    "prime_best_matches",
+    "top_matches",
+    "clear_match_caches",
+]
+
+_WS_RE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=8192)
 def _normalize(text: str) -> str:
     """Нормализация текста: убираем лишние пробелы, приводим к нижнему регистру."""
-    return re.sub(r"\s+", " ", text).strip().casefold()
+    return _WS_RE.sub(" ", text).strip().casefold()
+
 
+# Замена похожих букв латиницы на кириллицу — одна таблица на модуль
+_TYPO_TABLE = str.maketrans({
+    'o': 'о', 'O': 'О', 'a': 'а', 'A': 'А',
+    'e': 'е', 'E': 'Е', 'p': 'р', 'P': 'Р',
+    'c': 'с', 'C': 'С', 'x': 'х', 'X': 'Х',
+    'y': 'у', 'Y': 'У', 'k': 'к', 'K': 'К',
+})
 
+
+@lru_cache(maxsize=8192)
 def _remove_common_typos(text: str) -> str:
-    """Убираем типичные опечатки при распознавании."""
-    # Замена похожих букв кириллицы/латиницы
-    replacements = {
-        'o': 'о', 'O': 'О', 'a': 'а', 'A': 'А',
-        'e': 'е', 'E': 'Е', 'p': 'р', 'P': 'Р',
-        'c': 'с', 'C': 'С', 'x': 'х', 'X': 'Х',
-        'y': 'у', 'Y': 'У', 'k': 'к', 'K': 'К',
-    }
-    result = text
-    for lat, cyr in replacements.items():
-        result = result.replace(lat, cyr)
-    return result
+    """Убираем типичные опечатки при распознавании (один проход str.translate)."""
+    return text.translate(_TYPO_TABLE)
 
 
-def _token_overlap_score(a: str, b: str) -> float:
-    """Оценка пересечения слов в двух строках."""
-    tokens_a = set(a.split())
-    tokens_b = set(b.split())
+def _token_overlap_score(tokens_a: FrozenSet[str], tokens_b: FrozenSet[str]) -> float:
+    """Оценка пересечения слов (наборы токенов уже разбиты по пробелам)."""
     if not tokens_a or not tokens_b:
         return 0.0
     return len(tokens_a & tokens_b) / max(len(tokens_a), len(tokens_b))
 
 
-def _levenshtein_distance(s1: str, s2: str) -> int:
-    """Вычисляет расстояние Левенштейна между двумя строками."""
-    if len(s1) < len(s2):
-        return _levenshtein_distance(s2, s1)
-    
-    if len(s2) == 0:
-        return len(s1)
-    
-    previous_row = range(len(s2) + 1)
-    for i, c1 in enumerate(s1):
-        current_row = [i + 1]
-        for j, c2 in enumerate(s2):
-            # Стоимость вставки, удаления, замены
-            insertions = previous_row[j + 1] + 1
-            deletions = current_row[j] + 1
-            substitutions = previous_row[j] + (c1 != c2)
-            current_row.append(min(insertions, deletions, substitutions))
-        previous_row = current_row
-    
-    return previous_row[-1]
+def _prepare_text(text: str) -> str:
+    """Опечатки + нормализация — то, что делаем с обеими сторонами перед сравнением."""
+    return _normalize(_remove_common_typos(text))
 
 
-def calc_similarity(query: str, candidate: str) -> float:
-    """Возвращает оценку похожести (0..1), учитывая подстроку, пересечение токенов и опечатки."""
+@lru_cache(maxsize=4)
+def _prepare(candidates: Tuple[str, ...]) -> Tuple[Tuple[str, ...], List[str], List[FrozenSet[str]],
+                                                   Dict[str, str], np.ndarray]:
+    """
+    Нормализованные кандидаты, их токены, индекс точных совпадений
+    (нормализованное → первое исходное название) и длины нормализованных
+    строк — считаем один раз на справочник.
 
-    # Убираем опечатки перед сравнением
-    query_clean = _remove_common_typos(query)
-    candidate_clean = _remove_common_typos(candidate)
-    
-    q = _normalize(query_clean)
-    c = _normalize(candidate_clean)
-    
+    Справочники не меняются за время жизни процесса, поэтому вызывающий код
+    передаёт один и тот же tuple, и повторные запросы берут готовый результат.
+    """
+    norms = [_prepare_text(name) for name in candidates]
+    token_sets = [frozenset(c.split()) for c in norms]
+    exact: Dict[str, str] = {}
+    for name, c in zip(candidates, norms):
+        exact.setdefault(c, name)
+    lens = np.fromiter((len(c) for c in norms), dtype=np.float64, count=len(norms))
+    return candidates, norms, token_sets, exact, lens
+
+
+def _score_prepared(q: str, c: str,
+                    q_tokens: FrozenSet[str], c_tokens: FrozenSet[str],
+                    ratio: float, lev_score: float) -> float:
+    """Оценка похожести для уже нормализованных строк с заранее посчитанными метриками."""
     if not q or not c:
         return 0.0
 
@@ -81,41 +95,211 @@ def calc_similarity(query: str, candidate: str) -> float:
     elif c in q:
         base = 0.88 + (len(c) / len(q)) * 0.05
 
-    # SequenceMatcher для общей похожести
-    ratio = SequenceMatcher(None, q, c).ratio()
-    
     # Пересечение токенов (слов)
-    token_score = _token_overlap_score(q, c)
-    
-    # Расстояние Левенштейна (нормализованное)
-    max_len = max(len(q), len(c))
-    if max_len > 0:
-        lev_dist = _levenshtein_distance(q, c)
-        lev_score = 1.0 - (lev_dist / max_len)
-    else:
-        lev_score = 0.0
+    token_score = _token_overlap_score(q_tokens, c_tokens)
     
     # Взвешенная комбинация всех метрик
     blended = (
-        ratio * 0.4 +          # Общая похожесть
+        ratio * 0.4 +          # Общая похожесть (InDel-ratio)
         token_score * 0.25 +   # Пересечение слов
-        lev_score * 0.35       # Устойчивость к опечаткам
+        lev_score * 0.35       # Устойчивость к опечаткам (1 - Левенштейн / max_len)
     )
     
     # Возвращаем максимум из базовой оценки и комбинированной
     return max(base, blended)
 
 
+@lru_cache(maxsize=8192)
+def calc_similarity(query: str, candidate: str) -> float:
+    """Возвращает оценку похожести (0..1), учитывая подстроку, пересечение токенов и опечатки."""
+    q = _prepare_text(query)
+    c = _prepare_text(candidate)
+    return _score_prepared(
+        q, c,
+        frozenset(q.split()), frozenset(c.split()),
+        fuzz.ratio(q, c) / 100.0,
+        Levenshtein.normalized_similarity(q, c),
+    )
+
+
+def _char_metrics(q: str, norms: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """InDel-ratio и нормированный Левенштейн запроса со всеми кандидатами (0..1)."""
+    # Обе посимвольные метрики считаем для всех кандидатов одним вызовом в C
+    ratios = process.cdist([q], norms, scorer=fuzz.ratio, dtype="float64")[0] / 100.0
+    lev_scores = process.cdist([q], norms, scorer=Levenshtein.normalized_similarity,
+                               dtype="float64")[0]
+    return ratios, lev_scores
+
+
+def _score_all(q: str, norms: List[str], token_sets: List[FrozenSet[str]]) -> List[float]:
+    """Оценки calc_similarity нормализованного запроса со всеми кандидатами справочника."""
+    q_tokens = frozenset(q.split())
+    ratios, lev_scores = _char_metrics(q, norms)
+    return [
+        _score_prepared(q, c, q_tokens, c_tokens, ratio, lev_score)
+        for c, c_tokens, ratio, lev_score in zip(norms, token_sets, ratios.tolist(), lev_scores.tolist())
+    ]
+
+
+def _contenders(q_len: int, lens: np.ndarray, ratios: np.ndarray, lev_scores: np.ndarray) -> np.ndarray:
+    """
+    Номера кандидатов, которые ещё могут оказаться лучшими.
+
+    Без подстроки оценка лежит в [ratio·0.4 + lev·0.35, то же + 0.25] (вклад токенов 0..1),
+    значит всё, чья верхняя граница ниже лучшей нижней, можно не досчитывать.
+    Подстрока (q in c или c in q) даёт ratio ровно 2·min(len)/(сумма len) — это
+    потолок ratio по длинам, поэтому кандидаты под этим потолком подстрокой не являются.
+    """
+    lower = ratios * 0.4 + lev_scores * 0.35
+    length_bound = 2.0 * np.minimum(lens, q_len) / (lens + q_len)
+    maybe_substring = ratios >= length_bound - 1e-9
+    keep = maybe_substring | (lower + 0.25 >= lower.max() - 1e-9)
+    return np.flatnonzero(keep)
+
+
 def find_best_match(query: str, candidates: Iterable[str]) -> Tuple[Optional[str], float]:
-    """Ищет максимально похожее название среди candidates."""
+    """
+    Ищет максимально похожее название среди candidates.
+
+    Справочники лучше передавать одним и тем же tuple — тогда нормализация
+    кандидатов кешируется между вызовами.
+    """
+    if not isinstance(candidates, tuple):
+        candidates = tuple(str(cand) for cand in candidates)
+    names, norms, token_sets, exact, lens = _prepare(candidates)
+
+    q = _prepare_text(query)
+    if not q or not names:
+        return None, 0.0
+
+    # Точное совпадение после нормализации — лучше ничего не будет, fuzzy не нужен
+    hit = exact.get(q)
+    if hit is not None:
+        return hit, 1.0
+
+    ratios, lev_scores = _char_metrics(q, norms)
+    return _best_of(q, names, norms, token_sets, lens, ratios, lev_scores)
+
 
+def _best_of(q: str, names: Tuple[str, ...], norms: List[str], token_sets: List[FrozenSet[str]],
+             lens: np.ndarray, ratios: np.ndarray,
+             lev_scores: np.ndarray) -> Tuple[Optional[str], float]:
+    """Лучший кандидат по готовым посимвольным метрикам со всеми кандидатами."""
+    # Полную оценку (токены, подстрока) считаем только тем, кто проходит по границам
+    q_tokens = frozenset(q.split())
     best_name = None
     best_score = 0.0
-    for cand in candidates:
-        score = calc_similarity(query, str(cand))
+    for i in _contenders(len(q), lens, ratios, lev_scores).tolist():
+        score = _score_prepared(q, norms[i], q_tokens, token_sets[i],
+                                float(ratios[i]), float(lev_scores[i]))
         if score > best_score:
-            best_name = str(cand)
+            best_name = names[i]
             best_score = score
 
     return best_name, best_score
 
+
+def find_best_matches(queries: Iterable[str], candidates: Iterable[str]) -> List[Tuple[Optional[str], float]]:
+    """
+    find_best_match для нескольких запросов сразу: посимвольные метрики
+    всех запросов со всем справочником считаются одной матрицей cdist.
+    Результаты те же, что у find_best_match по отдельности.
+    """
+    if not isinstance(candidates, tuple):
+        candidates = tuple(str(cand) for cand in candidates)
+    names, norms, token_sets, exact, lens = _prepare(candidates)
+
+    queries = list(queries)
+    results: List[Tuple[Optional[str], float]] = [(None, 0.0)] * len(queries)
+    pending = []
+    for i, query in enumerate(queries):
+        q = _prepare_text(query)
+        if not q or not names:
+            continue
+        hit = exact.get(q)
+        if hit is not None:
+            results[i] = (hit, 1.0)
+        else:
+            pending.append((i, q))
+
+    if pending:
+        pending_qs = [q for _i, q in pending]
+        ratios = process.cdist(pending_qs, norms, scorer=fuzz.ratio, dtype="float64", workers=-1) / 100.0
+        lev_scores = process.cdist(pending_qs, norms, scorer=Levenshtein.normalized_similarity,
+                                   dtype="float64", workers=-1)
+        for row, (i, q) in enumerate(pending):
+            results[i] = _best_of(q, names, norms, token_sets, lens, ratios[row], lev_scores[row])
+
+    return results
+
+
+def top_matches(query: str, candidates: Iterable[str], limit: int = 5) -> List[Tuple[str, float]]:
+    """
+    Топ-limit похожих названий [(название, оценка), ...] по убыванию оценки —
+    для подсказок пользователю. Пустые названия пропускаются,
+    при равной оценке сохраняется порядок справочника.
+    """
+    if not isinstance(candidates, tuple):
+        candidates = tuple(str(cand) for cand in candidates)
+    names, norms, token_sets, _exact, _lens = _prepare(candidates)
+
+    q = _prepare_text(query)
+    if q:
+        scores = _score_all(q, norms, token_sets)
+    else:
+        scores = [0.0] * len(names)
+
+    scored = [(name, score) for name, c, score in zip(names, norms, scores) if c]
+    return heapq.nlargest(limit, scored, key=lambda x: x[1])
+
+
+# Память find_best_match_cached: (запрос, справочник) → результат. Обычный dict
+# вместо lru_cache, чтобы prime_best_matches мог заполнить его пачкой
+_MATCH_MEMO: Dict[Tuple[str, Tuple[str, ...]], Tuple[Optional[str], float]] = {}
+_MATCH_MEMO_MAX = 2048
+_MATCH_MEMO_LOCK = threading.Lock()
+
+
+def _remember_match(key: Tuple[str, Tuple[str, ...]], value: Tuple[Optional[str], float]) -> None:
+    with _MATCH_MEMO_LOCK:
+        if key not in _MATCH_MEMO and len(_MATCH_MEMO) >= _MATCH_MEMO_MAX:
+            # Вытесняем самую старую запись
+            _MATCH_MEMO.pop(next(iter(_MATCH_MEMO)))
+        _MATCH_MEMO[key] = value
+
+
+def find_best_match_cached(query: str, candidates: Tuple[str, ...]) -> Tuple[Optional[str], float]:
+    """find_best_match с памятью по паре (запрос, справочник) — для повторяющихся названий."""
+    key = (query, candidates)
+    result = _MATCH_MEMO.get(key)
+    if result is None:
+        result = find_best_match(query, candidates)
+        _remember_match(key, result)
+    return result
+
+
+def prime_best_matches(queries: Iterable[str], candidates: Tuple[str, ...]) -> None:
+    """
+    Заранее считает find_best_match_cached для всех queries одним пакетом
+    (find_best_matches), чтобы дальнейшие поштучные вызовы брали готовое.
+    """
+    missing = [q for q in dict.fromkeys(queries) if (q, candidates) not in _MATCH_MEMO]
+    if not missing:
+        return
+    for query, result in zip(missing, find_best_matches(missing, candidates)):
+        _remember_match((query, candidates), result)
+
+
+def clear_match_caches() -> None:
+    """
+    Сбрасывает кеши этого модуля (нормализация, подготовленные списки,
+    оценки и память find_best_match_cached).
+
+    Кеши поверх подбора в других модулях — catalog_lookup._get_purchase_item_cached
+    и daily_act._pick_best_known_names_cached — сбрасываются отдельно, их
+    cache_clear() вызывать вместе с этой функцией.
+    """
+    for cached in (_normalize, _remove_common_typos, _prepare, calc_similarity):
+        cached.cache_clear()
+    with _MATCH_MEMO_LOCK:
+        _MATCH_MEMO.clear()
@@ -0,0 +1,140 @@
+# openai_client.py
+"""
+Общий OpenAI клиент для голосового ввода и команд редактирования.
+"""
+
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Optional, Union
+
+from dotenv import load_dotenv
+from openai import OpenAI
+
+from config import PATHS, TIMEOUTS
+
+load_dotenv()
+
+_OPENAI_CLIENT = None
+
+# Кеш ответов OpenAI на диске: повторный запрос с тем же содержимым
+# (то же голосовое, тот же текст и список) отвечается без обращения к API
+_RESPONSE_CACHE_DIR = Path(PATHS.cache_dir) / "openai"
+# В кеше лежат расшифровки голосовых и ответы на команды пользователей —
+# храним не дольше суток: устаревшие записи не отдаются и удаляются при записи
+# новых, а неудачный разбор команды не повторяется бесконечно
+_RESPONSE_CACHE_MAX_AGE = 24 * 3600
+
+
+def get_openai_client() -> OpenAI:
+    """
+    Ленивая инициализация одного OpenAI клиента на процесс.
+
+    Whisper, улучшение расшифровки и разбор команд идут через один клиент,
+    а значит через один пул HTTP-соединений: TLS-рукопожатие делается один раз,
+    дальше соединения переиспользуются (keep-alive).
+    """
+    global _OPENAI_CLIENT
+    if _OPENAI_CLIENT is None:
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            raise RuntimeError("OPENAI_API_KEY не установлен в .env")
+        _OPENAI_CLIENT = OpenAI(
+            api_key=api_key,
+            timeout=TIMEOUTS.openai_request,
+            max_retries=2,
+        )
+    return _OPENAI_CLIENT
+
+
+def response_cache_path(kind: str, *parts: Union[str, bytes]) -> Path:
+    """Путь к закешированному ответу: SHA-256 от всех частей запроса."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else part.encode("utf-8"))
+        digest.update(b"\0")
+    return _RESPONSE_CACHE_DIR / kind / f"{digest.hexdigest()}.json"
+
+
+def read_cached_response(cache_path: Path) -> Optional[str]:
+    """Текст ответа из кеша или None, если его нет, он устарел или файл испорчен."""
+    try:
+        if time.time() - cache_path.stat().st_mtime > _RESPONSE_CACHE_MAX_AGE:
+            return None
+        with open(cache_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    text = data.get("text") if isinstance(data, dict) else None
+    return text if isinstance(text, str) and text else None
+
+
+def _prune_expired(cache_dir: Path) -> None:
+    """Удаляет из каталога кеша записи старше _RESPONSE_CACHE_MAX_AGE."""
+    cutoff = time.time() - _RESPONSE_CACHE_MAX_AGE
+    for entry in cache_dir.glob("*.json"):
+        try:
+            if entry.stat().st_mtime < cutoff:
+                entry.unlink()
+        except OSError:
+            pass
+
+
+def store_response(cache_path: Path, text: str) -> None:
+    """Сохраняет ответ в кеш; ошибки записи не мешают основному сценарию."""
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"text": text}, f, ensure_ascii=False)
+        os.replace(tmp_path, cache_path)
+        _prune_expired(cache_path.parent)
+    except OSError as e:
+        print(f"[WARN] Не удалось сохранить ответ OpenAI в кеш: {e}")
+
+
+def chat_completion(prompt: str, json_mode: bool = False, max_tokens: int = 500) -> str:
+    """
+    Один запрос к gpt-4o-mini с детерминированным ответом (temperature=0).
+
+    Args:
+        prompt: Текст запроса (одно сообщение пользователя)
+        json_mode: Просить модель вернуть JSON-объект (response_format=json_object)
+        max_tokens: Ограничение длины ответа
+
+    Returns:
+        Текст ответа без пробелов по краям
+    """
+    model = "gpt-4o-mini"
+    cache_path = response_cache_path("chat", model, str(json_mode), str(max_tokens), prompt)
+    cached = read_cached_response(cache_path)
+    if cached is not None:
+        return cached
+
+    kwargs = {}
+    if json_mode:
+        kwargs["response_format"] = {"type": "json_object"}
+
+    response = get_openai_client().chat.completions.create(
+        model=model,
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0,
+        max_tokens=max_tokens,
+        **kwargs,
+    )
+    choice = response.choices[0]
+    text = (choice.message.content or "").strip()
+    # Кешируем только законченный ответ: обрезанный по max_tokens (finish_reason
+    # "length") или битый JSON не кешируем — повтор запроса спросит модель заново
+    if text and choice.finish_reason == "stop" and (not json_mode or _is_json_object(text)):
+        store_response(cache_path, text)
+    return text
+
+
+def _is_json_object(text: str) -> bool:
+    try:
+        return isinstance(json.loads(text), dict)
+    except ValueError:
+        return False
@@ -1,8 +1,11 @@
 import os
 import json
 import time
+import threading
 from pathlib import Path
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -13,6 +16,25 @@ SERVICE_KEY = os.getenv("Service_key")
 
 TOKEN_CACHE_FILE = Path(__file__).parent / "sbis_token.json"
 
+# Токен в памяти процесса: файл читаем, только когда копия в памяти истекла.
+# Lock — чтобы параллельные отправки не обновляли токен одновременно.
+_TOKEN_LOCK = threading.Lock()
+_cached_token: dict | None = None
+
+# Общая сессия для всех запросов к online.sbis.ru: keep-alive избавляет
+# от TCP+TLS рукопожатия на каждом документе (акты часто уходят пачкой).
+# Повторы — только на сбоях соединения и 502/503/504 для безопасных методов:
+# POST с документом по умолчанию не переотправляется, чтобы не задвоить акт.
+_RETRY = Retry(
+    total=3,
+    backoff_factor=0.3,
+    status_forcelist=(502, 503, 504),
+    raise_on_status=False,
+)
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=10, max_retries=_RETRY))
+SESSION.headers.update({"User-Agent": "YenPrestoBot/1.0"})
+
 
 class SbisAuthError(Exception):
     pass
@@ -34,7 +56,7 @@ def _fetch_new_token() -> dict:
         "secret_key": SERVICE_KEY,
     }
 
-    resp = requests.post(url, json=payload, timeout=15)
+    resp = SESSION.post(url, json=payload, timeout=15)
     try:
         resp.raise_for_status()
     except requests.HTTPError as e:
@@ -78,14 +100,24 @@ def _load_cached_token() -> dict | None:
 
 
 def get_token() -> str:
-    cached = _load_cached_token()
-    now = int(time.time())
-
-    if cached and cached.get("exp", 0) > now:
-        return cached["token"]
-
-    token_data = _fetch_new_token()
-    return token_data["token"]
+    global _cached_token
+
+    token_data = _cached_token
+    if token_data and token_data["exp"] > int(time.time()):
+        return token_data["token"]
+
+    with _TOKEN_LOCK:
+        # Пока ждали блокировку, токен мог обновить другой поток
+        now = int(time.time())
+        if _cached_token and _cached_token["exp"] > now:
+            return _cached_token["token"]
+
+        cached = _load_cached_token()
+        if cached and cached.get("exp", 0) > now:
+            _cached_token = cached
+        else:
+            _cached_token = _fetch_new_token()
+        return _cached_token["token"]
 
 
 def get_auth_headers() -> dict:
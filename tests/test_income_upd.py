@@ -0,0 +1,45 @@
+import base64
+import uuid
+
+import numpy as np
+
+import income_upd
+from income_upd import _VECTORIZE_MIN_ROWS, _format_row_numbers, _income_upd_b64, build_income_upd_xml
+from utils import format_money, format_quantity
+
+
+def test_income_upd_b64_matches_xml(monkeypatch):
+    fixed = uuid.UUID("12345678-1234-5678-1234-567812345678")
+    monkeypatch.setattr(income_upd.uuid, "uuid4", lambda: fixed)
+    items = [
+        {"name": "КРАХМАЛ", "qty": 0.8},
+        {"name": "АНАНАС КОНСЕРВИРОВАННЫЙ", "qty": "0,43"},
+        {"name": "КРАХМАЛ", "qty": ".5"},
+    ]
+
+    xml = build_income_upd_xml("01.12.2025", "T1", items)
+    b64 = _income_upd_b64("01.12.2025", "T1", items)
+
+    assert base64.b64decode(b64) == xml
+    # Все три строки на месте, включая количество ".5"
+    assert xml.count("<СведТов".encode("windows-1251")) == 3
+    assert xml.startswith(b"<?xml version='1.0' encoding='windows-1251'?>")
+
+
+def test_format_row_numbers_vectorized_matches_scalar():
+    rng = np.random.default_rng(0)
+    n = 5000
+    assert n > _VECTORIZE_MIN_ROWS
+    qtys = np.concatenate([
+        rng.uniform(0.001, 1000, n // 2),
+        rng.integers(1, 500, n // 4).astype(float),
+        np.round(rng.uniform(0, 50, n - n // 2 - n // 4), 3),
+    ]).tolist()
+    prices = rng.uniform(0, 10000, n).tolist()
+    sums = [q * p for q, p in zip(qtys, prices)]
+
+    qty_strs, price_strs, sum_strs = _format_row_numbers(qtys, prices, sums)
+
+    assert qty_strs == [format_quantity(q) for q in qtys]
+    assert price_strs == [format_money(p) for p in prices]
+    assert sum_strs == [format_money(s) for s in sums]
@@ -0,0 +1,111 @@
+import random
+
+import pytest
+
+from catalog_lookup import CATALOG_NAMES
+from compositions import PARENT_NAMES, PRODUCTION_NAMES
+from name_matching import (
+    calc_similarity,
+    clear_match_caches,
+    find_best_match,
+    find_best_matches,
+    top_matches,
+)
+
+REFERENCE_LISTS = {
+    "catalog": CATALOG_NAMES,
+    "parent": PARENT_NAMES,
+    "production": PRODUCTION_NAMES,
+}
+
+
+def _queries(names, seed=0):
+    """Названия справочника и их искажения: опечатки, обрезки, регистр, лишние слова."""
+    rnd = random.Random(seed)
+    queries = ["", "   ", "абвгд", "2", "соус", "хот"]
+    for name in names:
+        queries.append(name)
+        queries.append(name.lower())
+        if len(name) > 3:
+            i = rnd.randrange(len(name))
+            queries.append(name[:i] + name[i + 1:])
+            j = rnd.randrange(len(name) - 1)
+            queries.append(name[:j] + name[j + 1] + name[j] + name[j + 2:])
+            queries.append(name[: max(2, len(name) // 2)])
+        words = name.split()
+        if len(words) > 1:
+            queries.append(" ".join(reversed(words)))
+            queries.append(words[0])
+        queries.append(f"{name} пф")
+    return queries
+
+
+def _brute_force_best(query, candidates):
+    best_name, best_score = None, 0.0
+    for cand in candidates:
+        score = calc_similarity(query, cand)
+        if score > best_score:
+            best_name, best_score = cand, score
+    return best_name, best_score
+
+
+def _old_top_matches(query, candidates, limit=5):
+    scores = [(n, calc_similarity(query, n)) for n in candidates if n.strip()]
+    scores.sort(key=lambda x: x[1], reverse=True)
+    return scores[:limit]
+
+
+@pytest.fixture(autouse=True)
+def _fresh_caches():
+    clear_match_caches()
+    yield
+    clear_match_caches()
+
+
+@pytest.mark.parametrize("source", sorted(REFERENCE_LISTS))
+def test_find_best_match_equals_brute_force(source):
+    names = REFERENCE_LISTS[source]
+    for query in _queries(names):
+        name, score = find_best_match(query, names)
+        expected_name, expected_score = _brute_force_best(query, names)
+        assert (name, score) == (expected_name, pytest.approx(expected_score, abs=1e-12)), query
+
+
+@pytest.mark.parametrize("source", sorted(REFERENCE_LISTS))
+def test_find_best_matches_equals_per_query(source):
+    names = REFERENCE_LISTS[source]
+    queries = _queries(names, seed=1)
+    assert find_best_matches(queries, names) == [find_best_match(q, names) for q in queries]
+
+
+@pytest.mark.parametrize("source", sorted(REFERENCE_LISTS))
+def test_top_matches_equals_full_sort(source):
+    names = REFERENCE_LISTS[source]
+    for query in _queries(names, seed=2)[::3]:
+        got = top_matches(query, names, limit=5)
+        expected = _old_top_matches(query, names, limit=5)
+        assert [n for n, _ in got] == [n for n, _ in expected], query
+        assert [s for _, s in got] == pytest.approx([s for _, s in expected], abs=1e-12), query
+
+
+def _large_reference_list():
+    """Больше 2000 названий: настоящие справочники плюс варианты с уточнениями."""
+    base = list(dict.fromkeys(CATALOG_NAMES + PARENT_NAMES + PRODUCTION_NAMES))
+    suffixes = ["ПФ", "охл", "зам", "1 кг", "0,5 л", "фасованный", "для соуса", "премиум", "СОЕВЫЙ", "ЖАРЕНЫЙ"]
+    names = base + [f"{name} {suffix}" for suffix in suffixes for name in base]
+    return tuple(dict.fromkeys(names))
+
+
+def test_large_reference_list_equals_brute_force():
+    names = _large_reference_list()
+    assert len(names) > 2000
+    rnd = random.Random(3)
+    queries = ["СЛОЬ", "БРОЩ", "СОУС СОЕВЫЙ", "СОЛЬ", "соус"]
+    queries += rnd.sample(_queries(CATALOG_NAMES + PARENT_NAMES, seed=3), 150)
+
+    for query in queries:
+        expected_name, expected_score = _brute_force_best(query, names)
+        name, score = find_best_match(query, names)
+        assert (name, score) == (expected_name, pytest.approx(expected_score, abs=1e-12)), query
+
+    assert find_best_matches(queries, names) == [find_best_match(q, names) for q in queries]
@@ -1,6 +1,6 @@
 import pytest
 
-from bot_simple import parse_items_from_text
+from bot_simple import parse_items_from_text, split_valid_invalid_items
 
 
 def test_voice_parsing_decimal_commas_and_sentences():
@@ -27,3 +27,26 @@ def test_voice_parsing_decimal_commas_and_sentences():
     for k, v in expected.items():
         assert k in got
         assert got[k] == pytest.approx(v, rel=1e-6)
+
+
+def test_split_valid_invalid_items_quantities():
+    items = [
+        {"name": "Дрожжи", "qty": ".5"},
+        {"name": "Мука", "qty": "2,5"},
+        {"name": "Соль", "qty": 3},
+        {"name": "Сахар", "qty": "шт"},
+        {"name": "Лук", "qty": "0"},
+        {"name": "Перец", "qty": ""},
+    ]
+    valid, bad = split_valid_invalid_items(items)
+
+    assert valid == [
+        {"name": "Дрожжи", "qty": 0.5},
+        {"name": "Мука", "qty": 2.5},
+        {"name": "Соль", "qty": 3.0},
+    ]
+    assert [(b["name"], b["reason"]) for b in bad] == [
+        ("Сахар", "invalid"),
+        ("Лук", "zero"),
+        ("Перец", "empty"),
+    ]
@@ -2,9 +2,25 @@
 Утилиты общего назначения для SBIS Telegram Bot.
 Функции для валидации, конвертации, форматирования.
 """
+import hashlib
+import os
+import re
 from datetime import datetime
 from typing import Union, Optional, Any
-import re
+
+import pandas as pd
+
+# Число в тексте: целое или дробное через точку/запятую
+NUMBER_RE = re.compile(r'\d+[.,]?\d*')
+# Переносы строк и табы / любые пробельные последовательности
+_CTRL_RE = re.compile(r'[\n\r\t]+')
+_WS_RE = re.compile(r'\s+')
+# Количество строкой: "2", "2,5", "0.44", ".5", "5.", "+2" — одна проверка до
+# float() для бота и построителей актов/УПД, чтобы принятая ботом позиция
+# не терялась при сборке XML. Использовать с fullmatch по strip()-строке.
+QTY_RE = re.compile(r'[+-]?(?:\d+(?:[.,]\d*)?|[.,]\d+)')
+# Обычная запись числа — её переводим во float без try/except
+_FLOAT_RE = re.compile(r'-?\d+(?:\.\d+)?')
 
 
 def to_float_safe(value: Any, default: float = 0.0) -> float:
@@ -36,7 +52,11 @@ def to_float_safe(value: Any, default: float = 0.0) -> float:
     
     if isinstance(value, str):
         value = value.strip().replace(",", ".")
-        if not value:
+        if _FLOAT_RE.fullmatch(value):
+            return float(value)
+        # Редкие формы (".5", "1e3") — через float(); строки без цифр
+        # (пустые, "мусор", "inf", "nan") сразу отдают default
+        if not any(ch.isdigit() for ch in value):
             return default
         try:
             return float(value)
@@ -137,7 +157,11 @@ def format_quantity(qty: Union[float, int], decimals: int = 3) -> str:
         >>> format_quantity(3.123)
         '3.123'
     """
-    formatted = f"{float(qty):.{decimals}f}".rstrip('0').rstrip('.')
+    value = float(qty)
+    # Целые количества (самый частый случай) — без форматирования и rstrip
+    if value.is_integer():
+        return str(int(value))
+    formatted = f"{value:.{decimals}f}".rstrip('0').rstrip('.')
     return formatted
 
 
@@ -159,10 +183,15 @@ def clean_string(text: str) -> str:
     """
     if not text:
         return ""
+    # Быстрый путь для уже чистой строки: из пробельных символов в ней только
+    # одиночные обычные пробелы (все прочие \s — непечатаемые)
+    stripped = text.strip()
+    if stripped.isprintable() and '  ' not in stripped:
+        return stripped
     # Убираем переносы строк, табы
-    text = re.sub(r'[\n\r\t]+', ' ', text)
+    text = _CTRL_RE.sub(' ', text)
     # Убираем множественные пробелы
-    text = re.sub(r'\s+', ' ', text)
+    text = _WS_RE.sub(' ', text)
     return text.strip()
 
 
@@ -202,8 +231,7 @@ def parse_quantity_from_text(text: str) -> Optional[float]:
         None
     """
     # Ищем число (включая дробные с . или ,)
-    pattern = r'\d+[.,]?\d*'
-    matches = re.findall(pattern, text)
+    matches = NUMBER_RE.findall(text)
     if matches:
         # Берём последнее найденное число
         return to_float_safe(matches[-1])
@@ -241,14 +269,15 @@ def summarize_validation(validated_items: list, warnings: list) -> dict:
     - matched_ratio: доля совпадений (0..1)
     - qty_sum: суммарное количество
     """
-    total = len(validated_items or [])
-    matched = sum(1 for it in validated_items if it.get("catalog_name"))
+    validated_items = validated_items or []
+    total = len(validated_items)
+    # Один проход: совпадения и сумма количества; мусорное qty считается нулём
+    matched = 0
     qty_sum = 0.0
     for it in validated_items:
-        try:
-            qty_sum += float(it.get("qty", 0) or 0)
-        except Exception:
-            pass
+        if it.get("catalog_name"):
+            matched += 1
+        qty_sum += to_float_safe(it.get("qty", 0))
     result = {
         "total": total,
         "matched": matched,
@@ -317,8 +346,7 @@ def extract_numbers_from_string(text: str) -> list[float]:
         >>> extract_numbers_from_string("Тесто 2.5 кг, Крутоны 0.3 кг")
         [2.5, 0.3]
     """
-    pattern = r'\d+[.,]?\d*'
-    matches = re.findall(pattern, text)
+    matches = NUMBER_RE.findall(text)
     return [to_float_safe(m) for m in matches]
 
 
@@ -345,6 +373,50 @@ def is_empty_or_whitespace(text: Optional[str]) -> bool:
     return not text or not text.strip()
 
 
+def read_excel_cached(path: str, cache_dir: str, sheet_name: Union[str, int] = 0):
+    """
+    pd.read_excel с дисковым кешем: разобранная таблица сохраняется в pickle,
+    ключ — путь, лист, время изменения и размер файла. Пока Excel не менялся,
+    следующий запуск читает pickle (миллисекунды вместо сотен мс на openpyxl).
+    При записи новой версии кеши прежних версий того же файла и листа удаляются.
+    
+    Args:
+        path: Путь к .xlsx
+        cache_dir: Каталог для кеша (создаётся при необходимости)
+        sheet_name: Лист, как в pd.read_excel
+        
+    Returns:
+        pandas.DataFrame
+    """
+    st = os.stat(path)
+    # Имя файла: <хеш пути и листа>_<хеш версии файла>.pkl — по первой части
+    # находим и удаляем кеши прежних версий той же таблицы
+    source_key = f"{os.path.abspath(path)}|{sheet_name}"
+    version_key = f"{st.st_mtime_ns}|{st.st_size}"
+    prefix = hashlib.sha1(source_key.encode("utf-8")).hexdigest()[:20] + "_"
+    cache_name = prefix + hashlib.sha1(version_key.encode("utf-8")).hexdigest()[:20] + ".pkl"
+    cache_path = os.path.join(cache_dir, cache_name)
+
+    if os.path.exists(cache_path):
+        try:
+            return pd.read_pickle(cache_path)
+        except Exception as e:
+            print(f"[WARN] Кеш {cache_path} не читается, перечитываю {path}: {e}")
+
+    df = pd.read_excel(path, sheet_name=sheet_name)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        df.to_pickle(tmp_path)
+        os.replace(tmp_path, cache_path)
+        for old_name in os.listdir(cache_dir):
+            if old_name.startswith(prefix) and old_name.endswith(".pkl") and old_name != cache_name:
+                os.remove(os.path.join(cache_dir, old_name))
+    except OSError as e:
+        print(f"[WARN] Не удалось сохранить кеш {cache_path}: {e}")
+    return df
+
+
 if __name__ == "__main__":
     # Тесты
     import doctest
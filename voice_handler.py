@@ -3,25 +3,32 @@
 Улучшенный модуль для обработки голосового ввода через Whisper API.
 """
 
-import os
 from pathlib import Path
-from openai import OpenAI
-from dotenv import load_dotenv
 
-load_dotenv()
+from openai_client import (
+    chat_completion,
+    get_openai_client,
+    read_cached_response,
+    response_cache_path,
+    store_response,
+)
 
-_OPENAI_CLIENT = None
+# Подсказка Whisper: контекст для лучшего распознавания названий и чисел
+_WHISPER_PROMPT = "Список продуктов для кафе с названиями и количествами"
 
+# Запрос к GPT для исправления расшифровки; подставляются контекст и текст
+_ENHANCE_PROMPT_TEMPLATE = """Ты — система обработки голосового ввода для {context}.
 
-def _get_openai_client() -> OpenAI:
-    """Ленивая инициализация OpenAI клиента."""
-    global _OPENAI_CLIENT
-    if _OPENAI_CLIENT is None:
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            raise RuntimeError("OPENAI_API_KEY не установлен в .env")
-        _OPENAI_CLIENT = OpenAI(api_key=api_key)
-    return _OPENAI_CLIENT
+Исходный текст от голосового распознавания:
+{raw_text}
+
+Задачи:
+1. Исправь ошибки распознавания (неправильно услышанные слова)
+2. Нормализуй названия продуктов (заглавные буквы)
+3. Убедись что числа правильно записаны (дробные через точку)
+4. Сохрани формат "Название Количество"
+
+Верни ТОЛЬКО исправленный текст без пояснений."""
 
 
 def transcribe_audio(file_path: str, language: str = "ru") -> str:
@@ -38,19 +45,28 @@ def transcribe_audio(file_path: str, language: str = "ru") -> str:
     Raises:
         RuntimeError: Если не удалось распознать речь
     """
-    client = _get_openai_client()
-    
-    if not Path(file_path).exists():
+    audio_path = Path(file_path)
+    if not audio_path.exists():
         raise FileNotFoundError(f"Аудиофайл не найден: {file_path}")
+
+    # Файл читаем один раз: эти же байты идут и в ключ кеша, и в запрос.
+    # Одно и то же голосовое (пересланное, повторная обработка) не отправляем
+    # в Whisper второй раз
+    audio = audio_path.read_bytes()
+    cache_path = response_cache_path("whisper", "whisper-1", language, _WHISPER_PROMPT, audio)
+    cached = read_cached_response(cache_path)
+    if cached is not None:
+        return cached
+
+    client = get_openai_client()
     
     try:
-        with open(file_path, "rb") as f:
-            result = client.audio.transcriptions.create(
-                model="whisper-1",
-                file=f,
-                language=language,
-                prompt="Список продуктов для кафе с названиями и количествами"  # Контекст для лучшего распознавания
-            )
+        result = client.audio.transcriptions.create(
+            model="whisper-1",
+            file=(audio_path.name, audio),
+            language=language,
+            prompt=_WHISPER_PROMPT,
+        )
         
         text = getattr(result, "text", None)
         if isinstance(result, dict):
@@ -59,7 +75,9 @@ def transcribe_audio(file_path: str, language: str = "ru") -> str:
         if not text:
             raise RuntimeError("Whisper вернул пустой результат")
         
-        return text.strip()
+        text = text.strip()
+        store_response(cache_path, text)
+        return text
         
     except Exception as e:
         raise RuntimeError(f"Ошибка распознавания речи: {e}") from e
@@ -76,30 +94,12 @@ def enhance_transcription_with_gpt(raw_text: str, context: str = "кафе") ->
     Returns:
         Улучшенный текст
     """
-    client = _get_openai_client()
-    
-    prompt = f"""Ты — система обработки голосового ввода для {context}.
-
-Исходный текст от голосового распознавания:
-{raw_text}
-
-Задачи:
-1. Исправь ошибки распознавания (неправильно услышанные слова)
-2. Нормализуй названия продуктов (заглавные буквы)
-3. Убедись что числа правильно записаны (дробные через точку)
-4. Сохрани формат "Название Количество"
-
-Верни ТОЛЬКО исправленный текст без пояснений."""
+    prompt = _ENHANCE_PROMPT_TEMPLATE.format(context=context, raw_text=raw_text)
 
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0,
-            max_tokens=500
-        )
-        
-        enhanced = response.choices[0].message.content.strip()
+        # Исправленный текст не длиннее исходного — потолок по его длине
+        # с запасом вместо фиксированных 500 токенов
+        enhanced = chat_completion(prompt, max_tokens=min(500, 64 + len(raw_text)))
         return enhanced if enhanced else raw_text
         
     except Exception: